@@ -1,7 +1,8 @@
 import re
 import os
+import logging
 import argparse
-from C_deStructor import C_deStructor  # Импортируйте ваш класс
+from C_deStructor import C_deStructor, _decl_re  # Импортируйте ваш класс
 
 def extract_init_declarations_from_text(init_text: str, target_struct: str) -> list:
     """
@@ -10,9 +11,8 @@ def extract_init_declarations_from_text(init_text: str, target_struct: str) -> l
       [<specifiers>] <target_struct> <varName>[<size>] = { ... };
     Возвращает список кортежей: (var_name, array_size, init_block)
     """
-    pattern = r'^(?P<spec>(?:\w+\s+)*)' + re.escape(target_struct) + r'\s+(?P<var>\w+)\s*(\[\s*(?P<size>\d*)\s*\])?\s*=\s*(?P<init>\{.*?\})\s*;'
     declarations = []
-    for m in re.finditer(pattern, init_text, flags=re.S | re.M):
+    for m in _decl_re(target_struct).finditer(init_text):
         var_name = m.group("var")
         size = m.group("size")
         if m.group(3):  # если квадратные скобки присутствуют
@@ -37,13 +37,19 @@ def update_output_file(new_decls: dict, output_file: str) -> None:
             content = f.read()
     else:
         content = ""
+    # Все замены выполняются за один проход по файлу: объединённый шаблон
+    # захватывает имя переменной, по которому callback подставляет новое объявление.
+    # Шаблон: слово "const", затем любое слово (тип), затем имя переменной, затем опциональный размер, затем "=" и блок до ";"
+    replaced = set()
+    if content and new_decls:
+        names = '|'.join(re.escape(var) for var in new_decls)
+        pattern = re.compile(r'const\s+\S+\s+(' + names + r')\s*(?:\[[^\]]*\])?\s*=\s*\{.*?\}\s*;', flags=re.DOTALL)
+        def _substitute(m):
+            replaced.add(m.group(1))
+            return new_decls[m.group(1)]
+        content = pattern.sub(_substitute, content)
     for var, decl in new_decls.items():
-        # Ищем существующее объявление с именем var.
-        # Шаблон: слово "const", затем любое слово (тип), затем имя переменной, затем опциональный размер, затем "=" и блок до ";"
-        pattern = r'(const\s+\S+\s+' + re.escape(var) + r'\s*(?:\[[^\]]*\])?\s*=\s*\{.*?\}\s*;)'
-        if re.search(pattern, content, flags=re.DOTALL):
-            content = re.sub(pattern, decl, content, flags=re.DOTALL)
-        else:
+        if var not in replaced:
             # Если объявления нет, просто добавляем его в конец файла
             content += "\n" + decl + "\n"
     with open(output_file, "w", encoding="utf-8") as f:
@@ -59,8 +65,13 @@ def main():
     parser.add_argument('--mapping-file', required=False, help="Путь к файлу с маппингом вложенных полей")
     parser.add_argument('--specifier', required=False, default="", help="Опциональный спецификатор (например, PROGMEM)")
     parser.add_argument('--output', required=True, help="Путь к итоговому .h-файлу")
+    parser.add_argument('--debug', action='store_true', help="Включить отладочный лог в log.log")
     args = parser.parse_args()
 
+    logging.basicConfig(filename="log.log",
+                        level=logging.DEBUG if args.debug else logging.WARNING,
+                        filemode='w')
+
     # Читаем весь текст инициализации из init-файла
     with open(args.init_file, "r", encoding="utf-8") as f:
         init_text = f.read()
@@ -71,26 +82,32 @@ def main():
         print("Не найдено объявлений инициализации для структуры", args.struct)
         return
 
+    # Один процессор на все объявления: хедер, view-файл и маппинг общие,
+    # поэтому читаем и загружаем их ровно один раз, а не на каждое объявление.
+    with open(args.header, "r", encoding="utf-8") as f:
+        header_text = f.read()
+    with open(args.view_file, "r", encoding="utf-8") as f:
+        view_text = f.read()
+    processor = C_deStructor(args.header, args.view_file, init_text, args.struct, args.target_view, args.mapping_file, args.specifier,
+                             header_text=header_text, view_text=view_text)
+    processor.load_full_structs()
+    processor.load_view_structs()
+    processor.load_mapping()
+
+    processor.setPostfix(args.specifier)
+
     new_declarations = {}
-    # Для каждого объявления создаем экземпляр класса и обрабатываем его
+    # Для каждого объявления обрабатываем его блок инициализации
     for spec, var_name, array_size, init_block in decls:
-        processor = C_deStructor(args.header, args.view_file, init_text, args.struct, args.target_view, args.mapping_file, args.specifier)
-        # Передаем конкретный блок инициализации в метод run()
         processed_block = processor.process_structure(init_block)
         if not processed_block:
             logging.warning("Объявление %s не соответствует ожидаемой структуре.", var_name)
             continue
-        # Формируем полное объявление, сохраняя исходные спецификаторы, имя переменной и размер массива
-        # Формирование объявления:
-        # Если array_size задан, то используем его, иначе одиночная структура
-        if array_size is not None:
-            if array_size == "[]":
-                full_decl = f"{spec} const {args.struct} {var_name}[]{' ' + args.specifier if args.specifier else ''} = {processed_block};"
-            else:
-                full_decl = f"{spec} const {args.struct} {var_name}[{array_size}]{' ' + args.specifier if args.specifier else ''} = {processed_block};"
-        else:
-            full_decl = f"{spec} const {args.struct} {var_name}{' ' + args.specifier if args.specifier else ''} = {processed_block};"
-        new_declarations[var_name] = full_decl.strip()
+        # Передаём уже извлечённые данные объявления напрямую — без повторного
+        # сканирования init_text — и формируем объявление общим методом,
+        # сохраняя исходные спецификаторы (плюс принудительный const).
+        processor.set_declaration_info(f"{spec} const" if spec else "const", var_name, array_size, init_block)
+        new_declarations[var_name] = processor.generate_declaration(processed_block, var_name=var_name).strip()
 
     # Обновляем или создаем выходной файл с новыми объявлениями
     update_output_file(new_declarations, args.output)